@@ -2,18 +2,42 @@ import os
 import io
 import re
 import json
+import time
+import wave
 import base64
-from typing import Any, Dict, List
+import string
+import logging
+import shelve
+import hashlib
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import streamlit as st
 import streamlit.components.v1 as components
-from audio_recorder_streamlit import audio_recorder
 
-# --- OpenAI SDK v1 style ---
+# --- Optional: faster JSON serialization ---
 try:
-    from openai import OpenAI
+    import orjson
 except Exception:
-    OpenAI = None
+    orjson = None
+
+# --- Optional: voice activity detection for chunked transcription ---
+try:
+    import webrtcvad
+except Exception:
+    webrtcvad = None
+
+# --- Optional: decoding/splitting of compressed uploads (needs ffmpeg) ---
+try:
+    from pydub import AudioSegment
+    from pydub.silence import split_on_silence as pydub_split_on_silence
+except Exception:
+    AudioSegment = None
+    pydub_split_on_silence = None
+
+logger = logging.getLogger(__name__)
 
 
 # ---------------------------
@@ -34,14 +58,52 @@ st.caption("Speak for up to ~3 minutes. Get a polished slide deck (HTML) with sp
 OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY") or ""
 OPENAI_CHAT_MODEL = st.secrets.get("OPENAI_CHAT_MODEL") or os.getenv("OPENAI_CHAT_MODEL") or "gpt-4o-mini"
 WHISPER_MODEL = "whisper-1"
+TRANSCRIBE_WORKERS = 6
+TRANSCRIBE_RETRIES = 3
+TRANSCRIBE_SHARD_S = 30
+TRANSCODE_MIN_BYTES = 1024 * 1024
+VAD_FRAME_MS = 30
+VAD_MIN_SILENCE_MS = 300
+VAD_MIN_SEGMENT_S = 5
+VAD_MIN_AUDIO_S = 10
+VAD_SAMPLE_RATES = (8000, 16000, 32000, 48000)
+SILENCE_SEEK_MS = 10
+# Above this "creativity" the user wants fresh samples, so deck responses are not cached
+DECK_CACHE_MAX_TEMPERATURE = 0.5
+# Fixed sampling seed so identical Generate clicks reproduce the same deck
+DECK_SEED = 94032
+RESPONSE_CACHE_PATH = ".deck_cache"
+RESPONSE_CACHE_TTL_S = 7 * 86400
+DECK_MEMO_TTL_S = 3600
+DECK_MEMO_MAX_ENTRIES = 64
+TRANSCRIPT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "voice2slide", "transcripts")
 
 if not OPENAI_API_KEY:
     st.warning("Add your OpenAI key in `.streamlit/secrets.toml` or Streamlit Cloud → Settings → Secrets (OPENAI_API_KEY).", icon="⚠️")
 
-# Instantiate client if possible
-client = None
-if OPENAI_API_KEY and OpenAI is not None:
-    client = OpenAI(api_key=OPENAI_API_KEY)
+
+@st.cache_resource(show_spinner=False)
+def get_openai_client(api_key: str) -> Optional[Any]:
+    """
+    One client per key for the whole process, so its HTTP connection pool (and TLS sessions)
+    survives reruns and is shared by Whisper and chat calls. The OpenAI SDK (httpx,
+    pydantic, …) is imported lazily so visitors without a key never pay for it.
+    """
+    # --- OpenAI SDK v1 style ---
+    try:
+        from openai import OpenAI
+    except Exception:
+        return None
+    return OpenAI(api_key=api_key)
+
+
+def get_client() -> Optional[Any]:
+    """
+    Return the shared client if possible, else None.
+    """
+    if not OPENAI_API_KEY:
+        return None
+    return get_openai_client(OPENAI_API_KEY)
 
 
 # ---------------------------
@@ -53,64 +115,34 @@ with st.sidebar:
     tone = st.selectbox("Tone", ["Pitch", "Educational", "Report"], index=0)
     n_slides = st.slider("Slide count", min_value=5, max_value=10, value=6, step=1)
     temperature = st.slider("Creativity (temperature)", min_value=0.2, max_value=0.8, value=0.5, step=0.1)
+    n_variants = st.slider("Variants per generation", min_value=1, max_value=3, value=1, step=1,
+                           help="Extra variants come from the same request, so the transcript is only billed once.")
     st.markdown("---")
-    st.markdown("**Privacy**: Audio is processed to create slides and then discarded. Nothing is persisted server-side.")
-    if st.button("🧹 Clear session"):
-        for k in list(st.session_state.keys()):
-            del st.session_state[k]
-        st.experimental_rerun()
+    st.markdown(
+        "**Privacy**: Audio is processed in memory and then discarded. Transcripts are cached on "
+        "the server in `~/.cache/voice2slide/transcripts` and generated decks in `.deck_cache` "
+        "(7 days) so repeat runs are instant."
+    )
+    purge_caches = st.checkbox("Also delete cached transcripts and decks", value=False)
+    clear_clicked = st.button("🧹 Clear session")
 
 
 # ---------------------------
-# Helpers
+# Deck Themes
 # ---------------------------
-def extract_json(text: str) -> Dict[str, Any]:
-    """
-    Extract the first valid JSON object from a string (tolerates code fences).
-    """
-    # Remove code fences if present
-    text = re.sub(r"^```(json)?|```$", "", text.strip(), flags=re.MULTILINE)
-    # Find first {...} block heuristically
-    m = re.search(r"\{.*\}", text, flags=re.DOTALL)
-    if not m:
-        raise ValueError("No JSON object found.")
-    raw = m.group(0)
-    return json.loads(raw)
+_CSS_SPACE_RE = re.compile(r"\s+")
+_CSS_PUNCT_RE = re.compile(r"\s*([{};:,])\s*")
 
 
-def coerce_deck(deck: Dict[str, Any], min_slides: int = 5) -> Dict[str, Any]:
-    """
-    Ensure required keys exist and minimum slide count is met.
-    """
-    deck.setdefault("title", "Generated Presentation")
-    deck.setdefault("theme", "minimal")
-    deck.setdefault("slides", [])
-    if not isinstance(deck["slides"], list):
-        deck["slides"] = []
+def _minify_css(css: str) -> str:
+    css = _CSS_SPACE_RE.sub(" ", css)
+    return _CSS_PUNCT_RE.sub(r"\1", css).strip()
 
-    # Pad slides if fewer than required
-    while len(deck["slides"]) < min_slides:
-        deck["slides"].append({
-            "heading": f"Slide {len(deck['slides'])+1}",
-            "bullets": ["Point A", "Point B", "Point C"],
-            "notes": "Speaker notes for this slide."
-        })
-    return deck
-
-
-def build_html(deck: Dict[str, Any]) -> str:
-    """
-    Build a single-file, offline HTML deck with simple navigation and speaker notes.
-    No external CDN dependencies.
-    """
-    title = deck.get("title", "Presentation")
-    slides = deck.get("slides", [])
-    theme = deck.get("theme", "minimal")
 
-    # Enhanced professional CSS themes
-    theme_css = {
-        "minimal": """
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
+# Enhanced professional CSS themes (built once at import, not per render).
+# Fonts come from the local system stack so decks render without any network request.
+THEME_CSS: Dict[str, str] = {
+    "minimal": """
             body { font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; margin:0; background:#f8fafc; }
             .deck { height: 100vh; display:flex; align-items:center; justify-content:center; background:linear-gradient(135deg, #667eea 0%, #764ba2 100%); }
             .slide { 
@@ -155,9 +187,8 @@ def build_html(deck: Dict[str, Any]) -> str:
                 padding: 10px 20px; border-radius: 20px; font-weight: 600; color: #4a5568;
                 backdrop-filter: blur(10px);
             }
-        """,
-        "corporate": """
-            @import url('https://fonts.googleapis.com/css2?family=Source+Sans+Pro:wght@300;400;600;700&display=swap');
+    """,
+    "corporate": """
             body { font-family: 'Source Sans Pro', -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif; margin:0; }
             .deck { height: 100vh; display:flex; align-items:center; justify-content:center; background:#1a365d; }
             .slide { 
@@ -207,9 +238,8 @@ def build_html(deck: Dict[str, Any]) -> str:
                 position: absolute; bottom: 40px; right: 60px; width: 60px; height: 20px;
                 background: #e2e8f0; border-radius: 4px; opacity: 0.7;
             }
-        """,
-        "dark": """
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
+    """,
+    "dark": """
             body { font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif; margin:0; background:#0f172a; }
             .deck { height: 100vh; display:flex; align-items:center; justify-content:center; background:linear-gradient(135deg, #1e293b 0%, #0f172a 100%); }
             .slide { 
@@ -257,58 +287,54 @@ def build_html(deck: Dict[str, Any]) -> str:
                 padding: 12px 20px; border-radius: 20px; font-weight: 600; color: #e2e8f0;
                 backdrop-filter: blur(10px); border: 1px solid rgba(99, 102, 241, 0.3);
             }
-        """,
-    }[theme if theme in ["minimal","corporate","dark"] else "minimal"]
+    """,
+}
+# Whitespace is irrelevant to browsers; strip it once here to shrink every deck payload
+THEME_CSS = {name: _minify_css(css) for name, css in THEME_CSS.items()}
 
-    # Build enhanced slides HTML
-    slides_html = []
-    total_slides = len(slides)
-    
-    for i, s in enumerate(slides, start=1):
-        heading = s.get("heading", f"Slide {i}")
-        bullets = s.get("bullets", [])
-        notes = s.get("notes", "")
-        bullets_html = "".join(f"<li>{b}</li>" for b in bullets[:7])
-        
-        slide_html = f"""
-        <section class="slide" data-idx="{i-1}">
-            <div class="slide-number">{i} / {total_slides}</div>
+
+# Single-pass HTML escaping via str.translate
+_HTML_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+
+_SLIDE_TEMPLATE = """
+        <section class="slide" data-idx="{idx}">
+            <div class="slide-number">{number} / {total}</div>
             <h2>{heading}</h2>
-            <ul>{bullets_html}</ul>
+            <ul>{bullets}</ul>
             <div class="notes"><strong>Speaker Notes:</strong><br>{notes}</div>
             <div class="company-logo"></div>
         </section>
         """
-        slides_html.append(slide_html)
 
-    html = f"""
+# Page skeleton; only the title, theme CSS and slides vary between decks
+_HTML_TEMPLATE = string.Template("""
 <!DOCTYPE html>
 <html>
 <head>
 <meta charset="utf-8" />
 <meta name="viewport" content="width=device-width, initial-scale=1" />
-<title>{title}</title>
+<title>$title</title>
 <style>
-{theme_css}
+$theme_css
 
 /* Print-specific styles for PDF generation */
-@media print {{
-    @page {{
+@media print {
+    @page {
         size: A4 landscape;
         margin: 0;
-    }}
+    }
     
-    body {{
+    body {
         background: white !important;
         -webkit-print-color-adjust: exact;
         print-color-adjust: exact;
-    }}
+    }
     
-    .deck {{
+    .deck {
         background: transparent !important;
-    }}
+    }
     
-    .slide {{
+    .slide {
         display: block !important;
         page-break-after: always;
         page-break-inside: avoid;
@@ -317,39 +343,39 @@ def build_html(deck: Dict[str, Any]) -> str:
         margin: 0 !important;
         box-shadow: none !important;
         border-radius: 0 !important;
-    }}
+    }
     
-    .slide:last-child {{
+    .slide:last-child {
         page-break-after: avoid;
-    }}
+    }
     
-    .controls {{
+    .controls {
         display: none !important;
-    }}
+    }
     
-    .header {{
+    .header {
         position: absolute !important;
         color: #333 !important;
         text-shadow: none !important;
-    }}
+    }
     
-    .slide-number {{
+    .slide-number {
         background: #f0f0f0 !important;
         color: #333 !important;
         backdrop-filter: none !important;
         border: 1px solid #ddd !important;
-    }}
+    }
     
-    .notes {{
+    .notes {
         display: none !important;
-    }}
-}}
+    }
+}
 </style>
 </head>
 <body>
-<div class="header">{title}</div>
+<div class="header">$title</div>
 <div class="deck">
-  {''.join(slides_html)}
+  $slides
 </div>
 <div class="controls">
   <button class="btn" onclick="prev()">◀ Prev</button>
@@ -359,99 +385,921 @@ def build_html(deck: Dict[str, Any]) -> str:
 <script>
 let idx = 0;
 const slides = Array.from(document.querySelectorAll('.slide'));
-function show(i) {{
+function show(i) {
   slides.forEach(s => s.style.display = 'none');
   idx = (i + slides.length) % slides.length;
   slides[idx].style.display = 'block';
-}}
-function next() {{ show(idx + 1); }}
-function prev() {{ show(idx - 1); }}
-function toggleNotes() {{
+}
+function next() { show(idx + 1); }
+function prev() { show(idx - 1); }
+function toggleNotes() {
   const s = slides[idx].querySelector('.notes');
   if (s) s.style.display = (s.style.display === 'none' || !s.style.display) ? 'block' : 'none';
-}}
-document.addEventListener('keydown', (e) => {{
+}
+document.addEventListener('keydown', (e) => {
   if (e.key === 'ArrowRight') next();
   if (e.key === 'ArrowLeft') prev();
   if (e.key.toLowerCase() === 'n') toggleNotes();
-}});
+});
 show(0);
 </script>
 </body>
 </html>
-    """.strip()
-    return html
+""".strip())
 
 
-def b64_download(data: bytes, filename: str, mime: str) -> str:
-    b64 = base64.b64encode(data).decode()
-    return f"data:{mime};base64,{b64}", b64
+# ---------------------------
+# Helpers
+# ---------------------------
+def json_loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse JSON with orjson when installed, else the stdlib. Both raise ValueError subclasses.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
-def transcribe_audio(file_path: str) -> str:
-    if not client:
-        raise RuntimeError("OpenAI client not initialized. Add OPENAI_API_KEY.")
-    with open(file_path, "rb") as f:
-        # OpenAI SDK v1
-        tr = client.audio.transcriptions.create(
-            model=WHISPER_MODEL,
-            file=f
-        )
+def json_dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    Serialize to UTF-8 JSON bytes with orjson when installed, else the stdlib.
+    """
+    if orjson is not None:
+        option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None, sort_keys=sort_keys).encode("utf-8")
+
+
+class JsonObjectScanner:
+    """
+    Track brace depth incrementally over (possibly streamed) text to find where the first
+    top-level {...} object closes. Braces inside string literals, including escaped quotes,
+    are ignored. Offsets are relative to the first character fed.
+    """
+
+    def __init__(self) -> None:
+        self.begin = -1
+        self.end = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consume the next piece of text; returns True once the object is complete.
+        """
+        if self.end >= 0:
+            return True
+        # Per-character loop: keep state in locals and write it back once per chunk
+        pos, begin, depth = self._pos, self.begin, self._depth
+        in_string, escaped = self._in_string, self._escaped
+        done = False
+        for c in chunk:
+            pos += 1
+            if begin < 0:
+                if c == "{":
+                    begin = pos - 1
+                    depth = 1
+            elif in_string:
+                if escaped:
+                    escaped = False
+                elif c == "\\":
+                    escaped = True
+                elif c == '"':
+                    in_string = False
+            elif c == '"':
+                in_string = True
+            elif c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+                if depth == 0:
+                    self.end = pos
+                    done = True
+                    break
+        self._pos, self.begin, self._depth = pos, begin, depth
+        self._in_string, self._escaped = in_string, escaped
+        return done
+
+
+def find_json_object(text: str, start: int = 0) -> Optional[Tuple[int, int]]:
+    """
+    Locate the first balanced {...} object at or after `start` in a single forward scan.
+    Returns the (begin, end) slice bounds, or None if no complete object is present.
+    """
+    scanner = JsonObjectScanner()
+    if not scanner.feed(text[start:]):
+        return None
+    return start + scanner.begin, start + scanner.end
+
+
+def extract_json(text: str) -> Dict[str, Any]:
+    """
+    Extract the first valid JSON object from a string (tolerates code fences and prose).
+    """
+    # Fast path: well-formed responses parse directly, skipping the scan
+    try:
+        data = json_loads(text)
+        if isinstance(data, dict):
+            return data
+    except ValueError:
+        pass
+    # Scan for balanced objects; a brace-y aside before the real JSON just moves us along
+    span = find_json_object(text)
+    while span is not None:
+        try:
+            data = json_loads(text[span[0]:span[1]])
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+        span = find_json_object(text, span[0] + 1)
+    raise ValueError("No JSON object found.")
+
+
+# Placeholder content for padded slides; the tuple is shared (JSON encoders emit it as a list)
+_DEFAULT_BULLETS = ("Point A", "Point B", "Point C")
+_DEFAULT_NOTES = "Speaker notes for this slide."
+
+
+def coerce_deck(deck: Dict[str, Any], min_slides: int = 5) -> Dict[str, Any]:
+    """
+    Ensure required keys exist and minimum slide count is met.
+    """
+    deck.setdefault("title", "Generated Presentation")
+    deck.setdefault("theme", "minimal")
+    slides = deck.setdefault("slides", [])
+    if not isinstance(slides, list):
+        slides = deck["slides"] = []
+
+    # Pad slides if fewer than required
+    start = len(slides)
+    needed = min_slides - start
+    if needed > 0:
+        slides.extend({
+            "heading": f"Slide {start+i+1}",
+            "bullets": _DEFAULT_BULLETS,
+            "notes": _DEFAULT_NOTES
+        } for i in range(needed))
+    return deck
+
+
+def _render_slide(i: int, s: Dict[str, Any], total_slides: int) -> str:
+    # Model output is untrusted text; escape it once per slide before interpolating
+    heading = str(s.get("heading", f"Slide {i}")).translate(_HTML_TABLE)
+    bullets = [str(b).translate(_HTML_TABLE) for b in s.get("bullets", [])[:7]]
+    notes = str(s.get("notes", "")).translate(_HTML_TABLE)
+    bullets_html = "\n".join([f"<li>{b}</li>" for b in bullets])
+    return _SLIDE_TEMPLATE.format(idx=i - 1, number=i, total=total_slides, heading=heading,
+                                  bullets=bullets_html, notes=notes)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def build_html(deck: Dict[str, Any]) -> str:
+    """
+    Build a single-file, offline HTML deck with simple navigation and speaker notes.
+    No external CDN dependencies. Memoized on deck content across reruns.
+    """
+    title = str(deck.get("title", "Presentation")).translate(_HTML_TABLE)
+    slides = deck.get("slides", [])
+    theme = deck.get("theme", "minimal")
+
+    theme_css = THEME_CSS.get(theme, THEME_CSS["minimal"])
+
+    # Build enhanced slides HTML
+    total_slides = len(slides)
+    slides_html = [_render_slide(i, s, total_slides) for i, s in enumerate(slides, start=1)]
+
+    return _HTML_TEMPLATE.substitute(title=title, theme_css=theme_css, slides="".join(slides_html))
+
+
+def deck_json_bytes(deck: Dict[str, Any]) -> bytes:
+    """
+    Serialize the deck (indented) for download. Not memoized itself: its only caller,
+    `deck_bundle_zip`, is.
+    """
+    return json_dumps(deck, indent=True)
+
+
+def utf8_bytes(text: str) -> bytes:
+    # Plain call on purpose: st.cache_data would hash the whole string to skip a cheaper encode
+    return text.encode("utf-8")
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def deck_bundle_zip(html: str, deck: Dict[str, Any], transcript: str) -> bytes:
+    """
+    Zip deck.html, deck.json and (if any) transcript.txt in memory for a single download.
+    Rebuilt only when one of the three inputs changes.
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("deck.html", utf8_bytes(html))
+        zf.writestr("deck.json", deck_json_bytes(deck))
+        if transcript:
+            zf.writestr("transcript.txt", utf8_bytes(transcript))
+    return buf.getvalue()
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def html_data_url(html: str) -> str:
+    """
+    Encode the deck as a stable data: URL for the preview iframe. The URL only changes with
+    the deck, so the browser keeps the rendered iframe across unrelated reruns.
+    """
+    return "data:text/html;base64," + base64.b64encode(utf8_bytes(html)).decode("ascii")
+
+
+_response_cache_lock = threading.Lock()
+
+
+def cache_key(*parts: Any) -> str:
+    """
+    Content-address a tuple of JSON-serializable inputs.
+    """
+    return hashlib.sha256(json_dumps(parts, sort_keys=True)).hexdigest()
+
+
+def cache_get(key: str) -> Optional[Any]:
+    """
+    Look up a response in the local disk cache. Expired entries and cache errors are misses.
+    """
+    try:
+        with _response_cache_lock, shelve.open(RESPONSE_CACHE_PATH) as db:
+            entry = db.get(key)
+    except Exception:
+        return None
+    if not entry or entry[0] < time.time():
+        return None
+    return entry[1]
+
+
+def cache_set(key: str, value: Any, expire: float = RESPONSE_CACHE_TTL_S) -> None:
+    """
+    Store a response in the local disk cache. Failures are ignored; the cache is best effort.
+    """
+    try:
+        with _response_cache_lock, shelve.open(RESPONSE_CACHE_PATH) as db:
+            db[key] = (time.time() + expire, value)
+    except Exception:
+        pass
+
+
+def cache_delete(key: str) -> None:
+    try:
+        with _response_cache_lock, shelve.open(RESPONSE_CACHE_PATH) as db:
+            db.pop(key, None)
+    except Exception:
+        pass
+
+
+def cache_clear() -> None:
+    try:
+        # flag="n" recreates an empty database whatever dbm backend shelve picked
+        with _response_cache_lock, shelve.open(RESPONSE_CACHE_PATH, flag="n"):
+            pass
+    except Exception as e:
+        logger.warning("Could not clear response cache: %s", e)
+
+
+@st.cache_resource(show_spinner=False)
+def _transcript_memo() -> Dict[Tuple[str, str], str]:
+    # Process-wide in-memory tier; a plain dict because transcription streams partial
+    # results to the page, which st.cache_data cannot record and replay
+    return {}
+
+
+def _transcript_cache_enabled() -> bool:
+    return os.getenv("VOICE2SLIDE_NO_TRANSCRIBE_CACHE") != "1"
+
+
+def load_cached_transcript(audio_sha: str) -> Optional[str]:
+    """
+    Return a previously stored transcript for this audio hash and Whisper model, checking
+    process memory then `TRANSCRIPT_CACHE_DIR/<sha>.json`. Unreadable entries are misses.
+    """
+    if not _transcript_cache_enabled():
+        return None
+    memo = _transcript_memo()
+    text = memo.get((WHISPER_MODEL, audio_sha))
+    if text is not None:
+        return text
+    path = os.path.join(TRANSCRIPT_CACHE_DIR, f"{audio_sha}.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            entry = json_loads(f.read())
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable transcript cache entry %s: %s", path, e)
+        return None
+    if not isinstance(entry, dict) or entry.get("model") != WHISPER_MODEL or not entry.get("text"):
+        return None
+    memo[(WHISPER_MODEL, audio_sha)] = entry["text"]
+    return entry["text"]
+
+
+def store_cached_transcript(audio_sha: str, text: str) -> None:
+    """
+    Remember a transcript in memory and on disk. Write failures are logged, never raised.
+    """
+    if not _transcript_cache_enabled():
+        return
+    _transcript_memo()[(WHISPER_MODEL, audio_sha)] = text
+    try:
+        os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(TRANSCRIPT_CACHE_DIR, f"{audio_sha}.json"), "wb") as f:
+            f.write(json_dumps({"text": text, "model": WHISPER_MODEL}))
+    except OSError as e:
+        logger.warning("Could not write transcript cache entry: %s", e)
+
+
+def purge_cached_transcripts() -> None:
+    """
+    Drop every cached transcript, in memory and on disk.
+    """
+    _transcript_memo().clear()
+    try:
+        names = os.listdir(TRANSCRIPT_CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.endswith(".json"):
+            try:
+                os.remove(os.path.join(TRANSCRIPT_CACHE_DIR, name))
+            except OSError as e:
+                logger.warning("Could not delete transcript cache entry %s: %s", name, e)
+
+
+def group_pieces(lengths: List[int], limit: int) -> List[Tuple[int, int]]:
+    """
+    Greedily group consecutive pieces into `[start, end)` index ranges whose total length stays
+    within `limit`, so each Whisper request gets as much context as the shard size allows.
+    A piece longer than `limit` on its own becomes a group by itself.
+    """
+    groups = []
+    start = total = 0
+    for i, n in enumerate(lengths):
+        if i > start and total + n > limit:
+            groups.append((start, i))
+            start, total = i, 0
+        total += n
+    if lengths:
+        groups.append((start, len(lengths)))
+    return groups
+
+
+def split_on_silence(wav_bytes: bytes) -> List[bytes]:
+    """
+    Split 16-bit mono PCM WAV audio at silences detected by webrtcvad and regroup the pieces
+    into WAV segments of at most TRANSCRIBE_SHARD_S. Returns an empty list when VAD is unavailable, the format is unsupported, or the clip
+    is too short to be worth splitting.
+    """
+    if webrtcvad is None:
+        return []
+    try:
+        with wave.open(io.BytesIO(wav_bytes), "rb") as w:
+            channels, width, rate, n_frames = w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getnframes()
+            pcm = w.readframes(n_frames)
+    except (wave.Error, EOFError):
+        return []
+    if channels != 1 or width != 2 or rate not in VAD_SAMPLE_RATES:
+        return []
+    if n_frames < rate * VAD_MIN_AUDIO_S:
+        return []
+
+    vad = webrtcvad.Vad(2)
+    frame_bytes = rate * VAD_FRAME_MS // 1000 * width
+    min_silence_frames = VAD_MIN_SILENCE_MS // VAD_FRAME_MS
+    min_segment_bytes = rate * VAD_MIN_SEGMENT_S * width
+
+    # Cut once a silence run is long enough and the current segment has reached a useful length
+    cuts = [0]
+    silence_run = 0
+    for pos in range(0, len(pcm) - frame_bytes + 1, frame_bytes):
+        if vad.is_speech(pcm[pos:pos + frame_bytes], rate):
+            silence_run = 0
+            continue
+        silence_run += 1
+        end = pos + frame_bytes
+        if silence_run >= min_silence_frames and end - cuts[-1] >= min_segment_bytes:
+            cuts.append(end)
+            silence_run = 0
+    # Fold a short tail (usually trailing silence) into the last segment
+    if len(cuts) > 1 and len(pcm) - cuts[-1] < min_segment_bytes:
+        cuts.pop()
+    cuts.append(len(pcm))
+    # Regroup pause-delimited pieces into shards, keeping only the cuts between shards
+    groups = group_pieces([b - a for a, b in zip(cuts, cuts[1:])], rate * TRANSCRIBE_SHARD_S * width)
+    cuts = [cuts[a] for a, _ in groups] + [len(pcm)]
+
+    segments = []
+    for start, end in zip(cuts, cuts[1:]):
+        out = io.BytesIO()
+        with wave.open(out, "wb") as w:
+            w.setnchannels(channels)
+            w.setsampwidth(width)
+            w.setframerate(rate)
+            w.writeframes(pcm[start:end])
+        segments.append(out.getvalue())
+    return segments
+
+
+def split_with_pydub(audio: bytes, filename: str) -> List[bytes]:
+    """
+    Decode any ffmpeg-readable clip with pydub, cut it on silence and regroup the pieces into
+    16 kHz mono WAV shards of at most TRANSCRIBE_SHARD_S. Returns an empty list when pydub is unavailable,
+    decoding fails, or the clip is too short to be worth splitting.
+    """
+    if AudioSegment is None:
+        return []
+    fmt = os.path.splitext(filename)[1].lstrip(".").lower() or None
+    try:
+        seg = AudioSegment.from_file(io.BytesIO(audio), format=fmt)
+    except Exception:
+        return []
+    if len(seg) < VAD_MIN_AUDIO_S * 1000:
+        return []
+    # Downsample once to what Whisper uses: silence detection gets cheaper, and 30 s shards of
+    # 16 kHz mono WAV stay under TRANSCODE_MIN_BYTES, so they are uploaded without a re-decode
+    seg = seg.set_frame_rate(16000).set_channels(1)
+    pieces = pydub_split_on_silence(
+        seg,
+        min_silence_len=VAD_MIN_SILENCE_MS,
+        silence_thresh=seg.dBFS - 16,
+        keep_silence=VAD_MIN_SILENCE_MS // 2,
+        # pydub's default steps 1 ms at a time, copying and measuring a window per millisecond
+        seek_step=SILENCE_SEEK_MS
+    )
+
+    groups = group_pieces([len(piece) for piece in pieces], TRANSCRIBE_SHARD_S * 1000)
+    shards = [sum(pieces[a + 1:b], pieces[a]) for a, b in groups]
+
+    segments = []
+    for shard in shards:
+        out = io.BytesIO()
+        shard.export(out, format="wav")
+        segments.append(out.getvalue())
+    return segments
+
+
+def _vad_compatible(audio: bytes) -> bool:
+    """
+    True for 16-bit mono WAV at one of the sample rates webrtcvad accepts.
+    """
+    try:
+        with wave.open(io.BytesIO(audio), "rb") as w:
+            return w.getnchannels() == 1 and w.getsampwidth() == 2 and w.getframerate() in VAD_SAMPLE_RATES
+    except (wave.Error, EOFError):
+        return False
+
+
+def split_audio(audio: bytes, filename: str) -> List[bytes]:
+    """
+    Split a clip for concurrent transcription: webrtcvad for WAV it can read directly, pydub
+    for everything else, including the recorder's WAV (41 kHz by default, which VAD rejects).
+    """
+    if webrtcvad is not None and _vad_compatible(audio):
+        return split_on_silence(audio)
+    return split_with_pydub(audio, filename)
+
+
+def _transcribe_file(client: Any, f: Any) -> str:
+    tr = client.audio.transcriptions.create(
+        model=WHISPER_MODEL,
+        file=f
+    )
     # Some SDK versions return .text, others may differ; normalize
     text = getattr(tr, "text", None)
     if not text and isinstance(tr, dict):
         text = tr.get("text")
+    return text or ""
+
+
+def compress_for_whisper(audio: bytes, filename: str) -> Tuple[bytes, str]:
+    """
+    Transcode to 16 kHz mono Opus (what Whisper resamples to anyway) to shrink the upload,
+    typically >10× for WAV. Small clips, or environments without pydub/ffmpeg, are returned
+    unchanged along with their original filename.
+    """
+    if AudioSegment is None or len(audio) < TRANSCODE_MIN_BYTES:
+        return audio, filename
+    fmt = os.path.splitext(filename)[1].lstrip(".").lower() or None
+    try:
+        seg = AudioSegment.from_file(io.BytesIO(audio), format=fmt)
+        out = io.BytesIO()
+        seg.set_frame_rate(16000).set_channels(1).export(out, format="ogg", codec="libopus", bitrate="24k")
+    except Exception:
+        return audio, filename
+    return out.getvalue(), f"{os.path.splitext(filename)[0] or 'audio'}.ogg"
+
+
+def _transcribe_bytes(client: Any, audio: bytes, filename: str) -> str:
+    audio, filename = compress_for_whisper(audio, filename)
+    buf = io.BytesIO(audio)
+    buf.name = filename
+    return _transcribe_file(client, buf)
+
+
+def _transcribe_segment(client: Any, idx: int, segment: bytes) -> str:
+    return _transcribe_bytes(client, segment, f"segment_{idx}.wav")
+
+
+def transcribe_audio(audio: bytes, filename: str = "audio.wav", audio_sha: Optional[str] = None,
+                     on_partial: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Transcribe in-memory audio with Whisper; `filename` tells the API the container format.
+    `audio_sha` (SHA-256 of the bytes) is the transcript cache key; computed when not supplied.
+
+    Clips longer than VAD_MIN_AUDIO_S are split on silence (see `split_audio`) and the segments
+    transcribed concurrently; `on_partial` receives the in-order text available so far as segments finish.
+    """
+    client = get_client()
+    if not client:
+        raise RuntimeError("OpenAI client not initialized. Add OPENAI_API_KEY.")
+    if audio_sha is None:
+        audio_sha = hashlib.sha256(audio).hexdigest()
+    cached = load_cached_transcript(audio_sha)
+    if cached is not None:
+        return cached
+
+    # Resolved here on the script thread: the workers below have no script context for
+    # st.cache_resource. The SDK retries only transient failures (connection errors,
+    # 408/409/429, 5xx) with backoff; bad keys and rejected files fail immediately.
+    client = client.with_options(max_retries=TRANSCRIBE_RETRIES)
+    segments = split_audio(audio, filename)
+    if len(segments) > 1:
+        parts: List[Optional[str]] = [None] * len(segments)
+        with ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS) as ex:
+            futures = {ex.submit(_transcribe_segment, client, i, seg): i for i, seg in enumerate(segments)}
+            for fut in as_completed(futures):
+                parts[futures[fut]] = fut.result().strip()
+                if on_partial is not None:
+                    done = []
+                    for p in parts:
+                        if p is None:
+                            break
+                        done.append(p)
+                    on_partial(" ".join(p for p in done if p))
+        text = " ".join(p for p in parts if p)
+    else:
+        text = _transcribe_bytes(client, audio, filename)
     if not text:
         raise RuntimeError("Transcription returned no text.")
+    store_cached_transcript(audio_sha, text)
     return text
 
 
-def generate_deck_json(transcript: str, theme: str, tone: str, n_slides: int, temperature: float) -> Dict[str, Any]:
-    if not client:
-        raise RuntimeError("OpenAI client not initialized. Add OPENAI_API_KEY.")
-    system = (
-        "You are an expert presentation designer creating polished, enterprise-grade slide decks.\n"
-        "RULES:\n"
-        "- Create 5–10 professional slides with clear, impactful content\n"
-        "- Each slide should have a compelling headline and 3–5 concise, actionable bullet points\n" 
-        "- Bullet points should be results-focused and use strong action words\n"
-        "- Include detailed 3–5 sentence speaker notes for each slide with key talking points\n"
-        "- Use professional language appropriate for executive presentations\n"
-        "- Structure content logically with clear flow between ideas\n"
-        "OUTPUT: JSON matching the schema exactly. No markdown, no commentary."
-    )
-    schema_hint = """
-{
-  "title": "string",
-  "theme": "minimal|corporate|dark",
-  "slides": [
-    { "heading": "string", "bullets": ["string", "string"], "notes": "string" }
-  ]
+DECK_SYSTEM_PROMPT = (
+    "You are an expert presentation designer creating polished, enterprise-grade slide decks.\n"
+    "RULES:\n"
+    "- Create 5–10 professional slides with clear, impactful content\n"
+    "- Each slide should have a compelling headline and 3–5 concise, actionable bullet points\n" 
+    "- Bullet points should be results-focused and use strong action words\n"
+    "- Include detailed 3–5 sentence speaker notes for each slide with key talking points\n"
+    "- Use professional language appropriate for executive presentations\n"
+    "- Structure content logically with clear flow between ideas\n"
+    "OUTPUT: JSON matching the schema exactly. No markdown, no commentary."
+)
+
+
+# Structured Outputs: the deck schema is enforced server-side instead of described in the prompt
+DECK_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "Deck",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "theme": {"type": "string", "enum": ["minimal", "corporate", "dark"]},
+                "slides": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "heading": {"type": "string"},
+                            "bullets": {"type": "array", "items": {"type": "string"}},
+                            "notes": {"type": "string"}
+                        },
+                        "required": ["heading", "bullets", "notes"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["title", "theme", "slides"],
+            "additionalProperties": False
+        }
+    }
 }
-""".strip()
 
+# Models without Structured Outputs (anything older than gpt-4o-2024-08-06 / gpt-4o-mini) get
+# plain JSON mode, with the same schema spelled out in the prompt instead
+DECK_FALLBACK_RESPONSE_FORMAT = {"type": "json_object"}
+DECK_SCHEMA_HINT = json_dumps(DECK_RESPONSE_FORMAT["json_schema"]["schema"]).decode("utf-8")
+
+
+@st.cache_resource(show_spinner=False)
+def _models_without_json_schema() -> set:
+    # Process-wide record of chat models that rejected a json_schema response_format
+    return set()
+
+
+def deck_response_format(model: str) -> Dict[str, Any]:
+    """
+    Structured Outputs unless `model` has already rejected them in this process.
+    """
+    if model in _models_without_json_schema():
+        return DECK_FALLBACK_RESPONSE_FORMAT
+    return DECK_RESPONSE_FORMAT
+
+
+def build_deck_messages(transcript: str, theme: str, tone: str, n_slides: int,
+                        schema_hint: bool = False) -> List[Dict[str, str]]:
+    """
+    Chat messages for one deck generation; shared by the streaming and Batch API paths.
+    `schema_hint` appends the deck schema for models running in plain JSON mode.
+    """
     user = f"""
 TRANSCRIPT:
 {transcript}
 
 STYLE:
 Tone={tone} | Theme={theme} | SlideCount={n_slides}
-
-Return ONLY valid JSON (no backticks). Schema:
-{schema_hint}
 """.strip()
+    if schema_hint:
+        user += f"\n\nSCHEMA:\n{DECK_SCHEMA_HINT}"
+
+    return [
+        {"role": "system", "content": DECK_SYSTEM_PROMPT},
+        {"role": "user", "content": user}
+    ]
+
+
+def deck_cache_key(transcript: str, theme: str, tone: str, n_slides: int, temperature: float, model: str,
+                   seed: Optional[int], n_variants: int) -> str:
+    return cache_key("deck-contents", transcript, theme, tone, n_slides, temperature, model, seed, n_variants)
+
+
+_deck_memo_lock = threading.Lock()
+
+
+@st.cache_resource(show_spinner=False)
+def _deck_memo() -> Dict[str, Tuple[float, List[str]]]:
+    # Process-wide in-memory tier; a plain dict rather than st.cache_data, which would record
+    # the streaming progress updates and replay them to the browser on every hit
+    return {}
+
+
+def _deck_disk_cache_enabled() -> bool:
+    return os.getenv("VOICE2SLIDE_NO_DECK_CACHE") != "1"
+
+
+def _remember_deck(key: str, contents: List[str]) -> None:
+    memo = _deck_memo()
+    with _deck_memo_lock:
+        memo.pop(key, None)
+        memo[key] = (time.time() + DECK_MEMO_TTL_S, contents)
+        # Dicts keep insertion order, so the first key is the least recently stored
+        while len(memo) > DECK_MEMO_MAX_ENTRIES:
+            memo.pop(next(iter(memo)))
+
+
+def load_cached_deck(key: str) -> Optional[List[str]]:
+    """
+    Return raw deck contents stored under `key`, checking process memory then the disk cache.
+    """
+    with _deck_memo_lock:
+        entry = _deck_memo().get(key)
+    if entry is not None and entry[0] >= time.time():
+        return entry[1]
+    if not _deck_disk_cache_enabled():
+        return None
+    contents = cache_get(key)
+    if contents is not None:
+        _remember_deck(key, contents)
+    return contents
+
+
+def store_cached_deck(key: str, contents: List[str]) -> None:
+    """
+    Remember raw deck contents in memory and, unless disabled, in the disk cache.
+    """
+    _remember_deck(key, contents)
+    if _deck_disk_cache_enabled():
+        cache_set(key, contents)
+
+
+def forget_cached_deck(key: str) -> None:
+    with _deck_memo_lock:
+        _deck_memo().pop(key, None)
+    cache_delete(key)
+
+
+def purge_cached_decks() -> None:
+    """
+    Drop every cached deck response, in memory and on disk.
+    """
+    with _deck_memo_lock:
+        _deck_memo().clear()
+    cache_clear()
+
+
+def _stream_deck_content(transcript: str, theme: str, tone: str, n_slides: int, temperature: float,
+                         model: str, seed: Optional[int], n_variants: int = 1,
+                         on_progress: Optional[Callable[[str], None]] = None) -> List[str]:
+    """
+    Stream `n_variants` raw deck JSON texts from one chat completion (`n=`, so the prompt is
+    billed once). `on_progress` receives a status line with first-token latency and a running
+    token count while the response arrives.
+
+    Raises ValueError when any variant's deck object never closes (truncated at max tokens,
+    refused, or cut off), so incomplete output is never returned to a cache.
+    """
+    client = get_client()
+    if not client:
+        raise RuntimeError("OpenAI client not initialized. Add OPENAI_API_KEY.")
+    from openai import BadRequestError  # already loaded by the client
 
-    resp = client.chat.completions.create(
-        model=OPENAI_CHAT_MODEL,
-        temperature=temperature,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user}
-        ]
+    def request(response_format: Dict[str, Any]) -> Any:
+        return client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            response_format=response_format,
+            stream=True,
+            n=n_variants,
+            **({"seed": seed} if seed is not None else {}),
+            messages=build_deck_messages(transcript, theme, tone, n_slides,
+                                         schema_hint=response_format is DECK_FALLBACK_RESPONSE_FORMAT)
+        )
+
+    response_format = deck_response_format(model)
+    try:
+        resp = request(response_format)
+    except BadRequestError as e:
+        if response_format is not DECK_RESPONSE_FORMAT or "json_schema" not in str(e):
+            raise
+        logger.info("%s rejected Structured Outputs; falling back to JSON mode", model)
+        _models_without_json_schema().add(model)
+        resp = request(DECK_FALLBACK_RESPONSE_FORMAT)
+    started = time.perf_counter()
+    first_token_s = None
+    n_tokens = 0
+    bufs: List[List[str]] = [[] for _ in range(n_variants)]
+    scanners = [JsonObjectScanner() for _ in range(n_variants)]
+    finish_reasons: List[Optional[str]] = [None] * n_variants
+    pending = n_variants
+    for chunk in resp:
+        for choice in chunk.choices:
+            # Structured Outputs refusals arrive in `delta.refusal` and end with an ordinary "stop"
+            if getattr(choice.delta, "refusal", None):
+                finish_reasons[choice.index] = "refusal"
+            elif choice.finish_reason and finish_reasons[choice.index] is None:
+                finish_reasons[choice.index] = choice.finish_reason
+            delta = choice.delta.content
+            if not delta or scanners[choice.index].end >= 0:
+                continue
+            if first_token_s is None:
+                first_token_s = time.perf_counter() - started
+            n_tokens += 1
+            bufs[choice.index].append(delta)
+            # A variant is done as soon as its deck object closes; anything after it is discarded
+            if scanners[choice.index].feed(delta):
+                pending -= 1
+        if on_progress is not None and first_token_s is not None:
+            on_progress(f"Generating… {n_tokens} tokens (first token after {first_token_s:.2f}s)")
+        if pending == 0:
+            resp.close()
+            break
+    incomplete = [i for i, scanner in enumerate(scanners) if scanner.end < 0]
+    if incomplete:
+        reasons = ", ".join(f"#{i + 1}: {finish_reasons[i] or 'no JSON object'}" for i in incomplete)
+        raise ValueError(f"Incomplete deck response ({reasons}).")
+    return ["".join(buf)[scanner.begin:scanner.end] for buf, scanner in zip(bufs, scanners)]
+
+
+def generate_deck_variants(transcript: str, theme: str, tone: str, n_slides: int, temperature: float,
+                           n_variants: int = 1, seed: Optional[int] = DECK_SEED, show_progress: bool = True,
+                           refresh: bool = False) -> List[Dict[str, Any]]:
+    """
+    Generate `n_variants` independent decks, memoized in process memory and on disk for
+    identical inputs. The fixed default `seed` makes repeat generations reproducible;
+    `seed=None` asks for unseeded, uncached samples, as do temperatures above
+    DECK_CACHE_MAX_TEMPERATURE. `refresh` drops any cached response for these inputs first.
+    Variants whose output cannot be parsed are skipped.
+    """
+    args = (transcript, theme, tone, n_slides, temperature, OPENAI_CHAT_MODEL, seed, n_variants)
+    cacheable = seed is not None and temperature <= DECK_CACHE_MAX_TEMPERATURE
+    key = deck_cache_key(*args)
+    if cacheable and refresh:
+        forget_cached_deck(key)
+    contents = load_cached_deck(key) if cacheable else None
+    if contents is None:
+        # Raw model output is cached, not the parsed deck, so parsing fixes apply without invalidation.
+        # Progress is drawn here, outside every cache tier, so hits show nothing stale.
+        progress = st.empty() if show_progress else None
+        try:
+            contents = _stream_deck_content(*args, on_progress=progress.markdown if progress is not None else None)
+        finally:
+            if progress is not None:
+                progress.empty()
+        if cacheable:
+            store_cached_deck(key, contents)
+    decks = []
+    for content in contents:
+        # The schema guarantees a parseable object, so this hits extract_json's direct-parse path
+        try:
+            decks.append(coerce_deck(extract_json(content), min_slides=5))
+        except ValueError:
+            continue
+    if not decks:
+        raise ValueError("No JSON object found.")
+    return decks
+
+
+def submit_deck_batch(transcript: str, theme: str, tones: List[str], n_slides: int, temperature: float) -> str:
+    """
+    Submit one deck request per tone through the OpenAI Batch API (discounted, asynchronous).
+    Returns the batch id; collect results later with `fetch_deck_batch`.
+    """
+    client = get_client()
+    if not client:
+        raise RuntimeError("OpenAI client not initialized. Add OPENAI_API_KEY.")
+    # Batch rows fail individually, so fall back only for models already seen rejecting json_schema
+    response_format = deck_response_format(OPENAI_CHAT_MODEL)
+    rows = [
+        {
+            "custom_id": f"tone-{t}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": OPENAI_CHAT_MODEL,
+                "temperature": temperature,
+                "seed": DECK_SEED,
+                "response_format": response_format,
+                "messages": build_deck_messages(transcript, theme, t, n_slides,
+                                                schema_hint=response_format is DECK_FALLBACK_RESPONSE_FORMAT),
+            },
+        }
+        for t in tones
+    ]
+    jsonl = io.BytesIO(b"\n".join(json_dumps(r) for r in rows))
+    jsonl.name = "deck_variants.jsonl"
+    batch_file = client.files.create(file=jsonl, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
     )
-    content = resp.choices[0].message.content
-    data = extract_json(content)
-    return coerce_deck(data, min_slides=5)
+    return batch.id
+
+
+def fetch_deck_batch(batch_id: str) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+    """
+    Return the batch status and, once completed, the parsed decks keyed by custom_id.
+    Rows that failed or did not parse are skipped.
+    """
+    client = get_client()
+    if not client:
+        raise RuntimeError("OpenAI client not initialized. Add OPENAI_API_KEY.")
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed" or not batch.output_file_id:
+        return batch.status, {}
+    decks: Dict[str, Dict[str, Any]] = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        row = json_loads(line)
+        choices = ((row.get("response") or {}).get("body") or {}).get("choices") or []
+        if not choices:
+            continue
+        try:
+            decks[row["custom_id"]] = coerce_deck(extract_json(choices[0]["message"]["content"]), min_slides=5)
+        except ValueError:
+            continue
+    return batch.status, decks
+
+
+def set_active_deck(deck: Dict[str, Any]) -> None:
+    """
+    Make `deck` the previewed deck, rebuilding its HTML only if the content changed.
+    """
+    deck_hash = hashlib.blake2b(json_dumps(deck, sort_keys=True), digest_size=16).hexdigest()
+    st.session_state["deck"] = deck
+    if st.session_state.get("deck_hash") != deck_hash or "html" not in st.session_state:
+        st.session_state["html"] = build_html(deck)
+        st.session_state["deck_hash"] = deck_hash
+
+
+# Handled here rather than in the sidebar so the cache helpers above are defined
+if clear_clicked:
+    if purge_caches:
+        purge_cached_transcripts()
+        purge_cached_decks()
+    st.session_state.clear()
+    st.rerun()
 
 
 # ---------------------------
@@ -466,6 +1314,7 @@ with col1:
 
 with col2:
     st.write("**Record** (click to start/stop)")
+    from audio_recorder_streamlit import audio_recorder  # deferred until the recorder renders
     audio_bytes = audio_recorder(
         text="",
         recording_color="#e11d48",
@@ -475,19 +1324,32 @@ with col2:
     )
     # audio_recorder returns WAV bytes if recorded
 
-audio_path = None
+# Audio stays in memory end to end (session state); nothing is written to disk.
+# Each rerun fingerprints the upload (BLAKE2b over a zero-copy view of Streamlit's buffer);
+# only when the fingerprint changes are the bytes copied and the SHA-256 cache key computed.
 if uploaded is not None:
-    suffix = os.path.splitext(uploaded.name)[1] or ".wav"
-    audio_path = os.path.join(st.experimental_get_query_params().get("tmpdir", ["."])[0], f"_upload{suffix}")
-    with open(audio_path, "wb") as f:
-        f.write(uploaded.read())
+    incoming, incoming_name, incoming_mime = uploaded.getbuffer(), uploaded.name, uploaded.type or "audio/wav"
 elif audio_bytes:
-    audio_path = "_recorded.wav"
-    with open(audio_path, "wb") as f:
-        f.write(audio_bytes)
+    incoming, incoming_name, incoming_mime = audio_bytes, "rec.wav", "audio/wav"
+else:
+    incoming = None
+    for k in ("audio_bytes", "audio_name", "audio_mime", "audio_hash", "audio_sha"):
+        st.session_state.pop(k, None)
+
+if incoming is not None:
+    incoming_hash = hashlib.blake2b(incoming, digest_size=16).hexdigest()
+    if st.session_state.get("audio_hash") != incoming_hash:
+        st.session_state["audio_bytes"] = bytes(incoming)
+        st.session_state["audio_hash"] = incoming_hash
+        st.session_state["audio_sha"] = hashlib.sha256(incoming).hexdigest()
+    st.session_state["audio_name"] = incoming_name
+    st.session_state["audio_mime"] = incoming_mime
 
-if audio_path:
-    st.audio(audio_path)
+audio_data = st.session_state.get("audio_bytes")
+audio_name = st.session_state.get("audio_name")
+audio_sha = st.session_state.get("audio_sha")
+if audio_data:
+    st.audio(audio_data, format=st.session_state["audio_mime"])
 else:
     st.info("Upload a file or record audio to continue.", icon="ℹ️")
 
@@ -496,16 +1358,19 @@ else:
 # UI — Step 2: Transcribe
 # ---------------------------
 st.subheader("2) Transcribe")
-if st.button("📝 Transcribe Audio", disabled=not audio_path):
-    if not client:
+if st.button("📝 Transcribe Audio", disabled=not audio_data):
+    if not get_client():
         st.error("OpenAI client not initialized. Add OPENAI_API_KEY.", icon="⚠️")
     else:
+        partial = st.empty()
         with st.spinner("Transcribing…"):
             try:
-                transcript = transcribe_audio(audio_path)
+                # Runs on the script thread so partial results can be written to the page
+                transcript = transcribe_audio(audio_data, audio_name, audio_sha, on_partial=partial.caption)
                 st.session_state["transcript"] = transcript
             except Exception as e:
                 st.error(f"Transcription failed: {e}")
+        partial.empty()
 
 transcript_text = st.session_state.get("transcript", "")
 transcript_text = st.text_area("Transcript (editable)", value=transcript_text, height=200, placeholder="Your transcript will appear here…")
@@ -520,26 +1385,79 @@ with gen_col1:
     generate_clicked = st.button("✨ Generate Deck", disabled=not st.session_state.get("transcript"))
 with gen_col2:
     regen_clicked = st.button("🔁 Regenerate (keep transcript)", disabled=not st.session_state.get("transcript"))
+force_refresh = st.checkbox("Force refresh (ignore cached decks)", value=False)
 
 if generate_clicked or regen_clicked:
-    if not client:
+    if not get_client():
         st.error("OpenAI client not initialized. Add OPENAI_API_KEY.", icon="⚠️")
     else:
         with st.spinner("Creating deck…"):
             try:
-                deck = generate_deck_json(
+                variants = generate_deck_variants(
                     transcript=st.session_state["transcript"],
                     theme=theme,
                     tone=tone,
                     n_slides=n_slides,
-                    temperature=temperature
+                    temperature=temperature,
+                    n_variants=n_variants,
+                    # Regenerate always asks the model for a new, unseeded sample
+                    seed=None if regen_clicked else DECK_SEED,
+                    refresh=force_refresh
                 )
-                st.session_state["deck"] = deck
-                html = build_html(deck)
-                st.session_state["html"] = html
+                st.session_state["deck_variants"] = variants
+                st.session_state["deck_variant_idx"] = 0
+                set_active_deck(variants[0])
             except Exception as e:
                 st.error(f"Deck generation failed: {e}")
 
+deck_variants = st.session_state.get("deck_variants") or []
+if len(deck_variants) > 1:
+    # Switch decks only on an actual selection change, so a batch variant picked below sticks
+    st.radio("Variant", range(len(deck_variants)), horizontal=True, key="deck_variant_idx",
+             format_func=lambda i: f"#{i + 1}: {deck_variants[i].get('title', 'Untitled')}",
+             on_change=lambda: set_active_deck(deck_variants[st.session_state["deck_variant_idx"]]))
+
+with st.expander("🧪 Try variations (Batch API — cheaper, results may take a while)"):
+    variant_tones = st.multiselect("Tones to try", ["Pitch", "Educational", "Report"], default=["Pitch", "Educational", "Report"])
+    var_col1, var_col2 = st.columns([1,1])
+    with var_col1:
+        submit_variants = st.button(f"📦 Submit {len(variant_tones)} variants",
+                                    disabled=not (st.session_state.get("transcript") and variant_tones))
+    with var_col2:
+        check_variants = st.button("🔄 Check variants", disabled=not st.session_state.get("batch_id"))
+
+    if submit_variants:
+        try:
+            st.session_state["batch_id"] = submit_deck_batch(
+                transcript=st.session_state["transcript"],
+                theme=theme,
+                tones=variant_tones,
+                n_slides=n_slides,
+                temperature=temperature
+            )
+            st.session_state.pop("decks", None)
+        except Exception as e:
+            st.error(f"Batch submission failed: {e}")
+
+    # Batches complete asynchronously (up to the 24h window), so status is polled on demand
+    if check_variants:
+        try:
+            status, decks = fetch_deck_batch(st.session_state["batch_id"])
+            st.session_state["batch_status"] = status
+            if decks:
+                st.session_state["decks"] = decks
+        except Exception as e:
+            st.error(f"Batch status check failed: {e}")
+
+    if st.session_state.get("batch_id"):
+        st.caption(f"Batch `{st.session_state['batch_id']}` — status: {st.session_state.get('batch_status', 'submitted')}")
+
+    decks = st.session_state.get("decks")
+    if decks:
+        variant_id = st.selectbox("Variant", list(decks.keys()))
+        if st.button("👀 Use this variant"):
+            set_active_deck(decks[variant_id])
+
 # ---------------------------
 # UI — Step 4: Preview & Download
 # ---------------------------
@@ -548,17 +1466,11 @@ html = st.session_state.get("html")
 
 if deck and html:
     st.subheader("4) Preview")
-    components.html(html, height=700, scrolling=True)
+    components.iframe(html_data_url(html), height=700, scrolling=True)
 
     st.subheader("5) Download")
-    html_bytes = html.encode("utf-8")
-    st.download_button("💾 Download HTML Deck", data=html_bytes, file_name="deck.html", mime="text/html")
-
-    # Also offer raw JSON + transcript for editing offline
-    st.download_button("💾 Download JSON (slides)", data=json.dumps(deck, indent=2).encode("utf-8"),
-                       file_name="deck.json", mime="application/json")
-    if st.session_state.get("transcript"):
-        st.download_button("💾 Download Transcript (.txt)", data=st.session_state["transcript"].encode("utf-8"),
-                           file_name="transcript.txt", mime="text/plain")
+    # One bundle: the HTML deck plus raw JSON + transcript for editing offline
+    bundle = deck_bundle_zip(html, deck, st.session_state.get("transcript", ""))
+    st.download_button("💾 Download All (zip)", data=bundle, file_name="deck_bundle.zip", mime="application/zip")
 
     st.info("Tip: Open the HTML deck and **Print to PDF** in your browser to create a PDF version.", icon="💡")